@@ -28,6 +28,8 @@ class ServiceManager:
             "orchestrator": 9004,
             "weather-mock": 9005
         }
+        # Spread cores across services; uvicorn workers share one listening socket
+        self.workers = max(2, (os.cpu_count() or 1) // len(self.ports))
         
     def start_service(self, name: str, env_vars: Optional[Dict[str, str]] = None) -> bool:
         """Start a single service"""
@@ -40,6 +42,11 @@ class ServiceManager:
         env = os.environ.copy()
         if env_vars:
             env.update(env_vars)
+        # Shared helpers imported by the gateway and orchestrator
+        common_path = str((self.base_path / "services" / "common").resolve())
+        env["PYTHONPATH"] = os.pathsep.join(
+            p for p in (common_path, env.get("PYTHONPATH")) if p
+        )
         
         port = self.ports.get(name, 8000)
         
@@ -48,7 +55,11 @@ class ServiceManager:
             "app.main:app",
             "--host", "0.0.0.0",
             "--port", str(port),
-            "--reload"
+            "--loop", "uvloop",
+            "--http", "httptools",
+            # Match the services' client keepalive so pre-warmed connections survive idle gaps
+            "--timeout-keep-alive", "30",
+            "--workers", str(self.workers)
         ]
         
         try:
@@ -60,7 +71,7 @@ class ServiceManager:
                 stderr=subprocess.PIPE
             )
             self.services[name] = process
-            print(f"✓ Started {name} on port {port}")
+            print(f"✓ Started {name} on port {port} ({self.workers} workers)")
             return True
         except Exception as e:
             print(f"✗ Failed to start {name}: {e}")
@@ -77,30 +88,28 @@ class ServiceManager:
                 process.kill()
                 print(f"✓ Force-stopped {name}")
     
-    def check_health(self, service: str, port: int) -> bool:
+    async def check_health(self, client: httpx.AsyncClient, port: int) -> bool:
         """Check if a service is healthy"""
         try:
-            response = httpx.get(f"http://localhost:{port}/health", timeout=2)
+            response = await client.get(f"http://localhost:{port}/health")
             return response.status_code == 200
-        except:
+        except httpx.HTTPError:
             return False
     
-    def wait_for_services(self, timeout: int = 30) -> bool:
-        """Wait for all services to be healthy"""
+    async def wait_for_services(self, timeout: int = 30) -> bool:
+        """Wait for all services to be healthy, probing them concurrently"""
         start_time = time.time()
+        ports = [port for name, port in self.ports.items() if name in self.services]
         
-        while time.time() - start_time < timeout:
-            all_healthy = True
-            for name, port in self.ports.items():
-                if name in self.services:
-                    if not self.check_health(name, port):
-                        all_healthy = False
-                        break
-            
-            if all_healthy:
-                return True
-            
-            time.sleep(1)
+        async with httpx.AsyncClient(timeout=2) as client:
+            while time.time() - start_time < timeout:
+                results = await asyncio.gather(
+                    *[self.check_health(client, port) for port in ports]
+                )
+                if all(results):
+                    return True
+                
+                await asyncio.sleep(0.1)
         
         return False
 
@@ -169,41 +178,48 @@ class PerformanceTester:
         """Run a simple performance test"""
         print(f"\nRunning performance test: {num_requests} requests, {concurrent} concurrent")
         
-        async def make_request():
-            async with httpx.AsyncClient(timeout=30.0) as client:
-                start = time.time()
-                try:
-                    response = await client.post(
-                        f"{self.base_url}:9004/execute",
-                        json={
-                            "slug": self.tool_slug,
-                            "input": {
-                                "city": "TestCity",
-                                "country": "TestCountry"
-                            }
+        async def make_request(client: httpx.AsyncClient):
+            start = time.time()
+            try:
+                response = await client.post(
+                    f"{self.base_url}:9004/execute",
+                    json={
+                        "slug": self.tool_slug,
+                        "input": {
+                            "city": "TestCity",
+                            "country": "TestCountry"
                         }
-                    )
-                    duration = time.time() - start
-                    return {
-                        "success": response.status_code == 200,
-                        "duration": duration,
-                        "status": response.status_code
-                    }
-                except Exception as e:
-                    duration = time.time() - start
-                    return {
-                        "success": False,
-                        "duration": duration,
-                        "error": str(e)
                     }
+                )
+                duration = time.time() - start
+                return {
+                    "success": response.status_code == 200,
+                    "duration": duration,
+                    "status": response.status_code
+                }
+            except Exception as e:
+                duration = time.time() - start
+                return {
+                    "success": False,
+                    "duration": duration,
+                    "error": str(e)
+                }
         
-        # Run requests in batches
-        results = []
-        for i in range(0, num_requests, concurrent):
-            batch_size = min(concurrent, num_requests - i)
-            batch = await asyncio.gather(*[make_request() for _ in range(batch_size)])
-            results.extend(batch)
-            print(f"  Completed {i + batch_size}/{num_requests} requests")
+        # Keep exactly `concurrent` requests in flight instead of waiting on batch barriers
+        sem = asyncio.Semaphore(concurrent)
+        completed = 0
+        
+        async def bounded(client: httpx.AsyncClient):
+            nonlocal completed
+            async with sem:
+                result = await make_request(client)
+            completed += 1
+            if completed % concurrent == 0 or completed == num_requests:
+                print(f"  Completed {completed}/{num_requests} requests")
+            return result
+        
+        async with httpx.AsyncClient(timeout=30.0) as client:
+            results = await asyncio.gather(*[bounded(client) for _ in range(num_requests)])
         
         # Calculate statistics
         successful = [r for r in results if r["success"]]
@@ -238,70 +254,138 @@ class PerformanceTester:
 class SQLiteSetup:
     """Setup SQLite database for testing"""
     
+    DB_PATH = Path('toolevo.db')
+    
+    TABLES = '''
+        CREATE TABLE IF NOT EXISTS tools (
+            id CHAR(32) PRIMARY KEY,
+            slug TEXT UNIQUE NOT NULL,
+            display_name TEXT NOT NULL,
+            description TEXT,
+            created_at TIMESTAMP DEFAULT (strftime('%Y-%m-%d %H:%M:%f', 'now')),
+            updated_at TIMESTAMP DEFAULT (strftime('%Y-%m-%d %H:%M:%f', 'now'))
+        );
+        
+        CREATE TABLE IF NOT EXISTS tool_versions (
+            id CHAR(32) PRIMARY KEY,
+            tool_id CHAR(32) NOT NULL,
+            version TEXT NOT NULL,
+            status VARCHAR(10) DEFAULT 'draft'
+                CHECK (status IN ('draft', 'active', 'deprecated', 'retired')),
+            input_schema TEXT NOT NULL,
+            output_schema TEXT NOT NULL,
+            endpoint_protocol VARCHAR(8) NOT NULL
+                CHECK (endpoint_protocol IN ('http', 'https', 'grpc', 'internal')),
+            endpoint_method VARCHAR(6)
+                CHECK (endpoint_method IN ('GET', 'POST', 'PUT', 'PATCH', 'DELETE')),
+            endpoint_url TEXT,
+            auth_type VARCHAR(7) DEFAULT 'none'
+                CHECK (auth_type IN ('none', 'api_key', 'bearer', 'basic', 'oauth2')),
+            auth_key_name TEXT,
+            auth_key_location VARCHAR(6)
+                CHECK (auth_key_location IN ('header', 'query', 'cookie')),
+            cost_per_call_usd NUMERIC(12, 6),
+            valid_from TIMESTAMP,
+            valid_to TIMESTAMP,
+            created_at TIMESTAMP DEFAULT (strftime('%Y-%m-%d %H:%M:%f', 'now')),
+            updated_at TIMESTAMP DEFAULT (strftime('%Y-%m-%d %H:%M:%f', 'now')),
+            FOREIGN KEY (tool_id) REFERENCES tools(id)
+        );
+    '''
+    
+    # Idempotent, so it also runs on an existing toolevo.db to pick up new indexes
+    INDEXES = '''
+        -- Superseded by the indexes below
+        DROP INDEX IF EXISTS ix_tool_versions_tool_id;
+        DROP INDEX IF EXISTS ix_tv_active;
+        
+        -- Indexes matching the registry models (slug lookup, /resolve)
+        CREATE UNIQUE INDEX IF NOT EXISTS ix_tools_slug ON tools (slug);
+        CREATE INDEX IF NOT EXISTS ix_tv_tool_status_created
+            ON tool_versions (tool_id, status, created_at);
+        CREATE INDEX IF NOT EXISTS ix_tool_versions_tool_id_created
+            ON tool_versions (tool_id, created_at);
+        CREATE INDEX IF NOT EXISTS ix_tool_versions_cost
+            ON tool_versions (cost_per_call_usd);
+        
+        -- Older databases may hold several active versions per tool; keep the
+        -- newest one so the unique index below can be built
+        UPDATE tool_versions SET status = 'deprecated'
+        WHERE id IN (
+            SELECT id FROM (
+                SELECT id, row_number() OVER (
+                    PARTITION BY tool_id ORDER BY created_at DESC, id DESC
+                ) AS rn
+                FROM tool_versions WHERE status = 'active'
+            ) WHERE rn > 1
+        );
+        CREATE UNIQUE INDEX IF NOT EXISTS ix_tool_versions_active
+            ON tool_versions (tool_id) WHERE status = 'active';
+    '''
+    
+    @staticmethod
+    def has_tables() -> bool:
+        """Check whether both registry tables already exist"""
+        import sqlite3
+        
+        conn = sqlite3.connect(SQLiteSetup.DB_PATH)
+        try:
+            rows = conn.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'table' "
+                "AND name IN ('tools', 'tool_versions')"
+            ).fetchall()
+        finally:
+            conn.close()
+        return len(rows) == 2
+    
     @staticmethod
     def create_database():
-        """Create SQLite database with schema"""
+        """Create SQLite database with schema; an existing one only gets its indexes updated"""
         import sqlite3
         
-        conn = sqlite3.connect('toolevo.db')
-        cursor = conn.cursor()
+        existing = SQLiteSetup.DB_PATH.exists() and SQLiteSetup.has_tables()
         
-        # Create tools table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS tools (
-                id TEXT PRIMARY KEY,
-                slug TEXT UNIQUE NOT NULL,
-                display_name TEXT NOT NULL,
-                description TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
+        # Autocommit mode: the schema script manages its own transaction
+        conn = sqlite3.connect(SQLiteSetup.DB_PATH, isolation_level=None)
         
-        # Create tool_versions table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS tool_versions (
-                id TEXT PRIMARY KEY,
-                tool_id TEXT NOT NULL,
-                version TEXT NOT NULL,
-                status TEXT DEFAULT 'draft',
-                input_schema TEXT NOT NULL,
-                output_schema TEXT NOT NULL,
-                endpoint_protocol TEXT NOT NULL,
-                endpoint_method TEXT,
-                endpoint_url TEXT,
-                auth_type TEXT DEFAULT 'none',
-                auth_key_name TEXT,
-                auth_key_location TEXT,
-                cost_per_call_usd TEXT,
-                valid_from TIMESTAMP,
-                valid_to TIMESTAMP,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (tool_id) REFERENCES tools(id)
-            )
-        ''')
+        # Same tuning as the registry's engine; journal_mode=WAL persists in the file
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute('PRAGMA mmap_size=268435456')
+        conn.execute('PRAGMA cache_size=-64000')
+        conn.execute('PRAGMA temp_store=MEMORY')
         
-        conn.commit()
+        tables = '' if existing else SQLiteSetup.TABLES
+        conn.executescript(f'BEGIN;\n{tables}{SQLiteSetup.INDEXES}\nCOMMIT;')
         conn.close()
-        print("✓ Created SQLite database")
+        if existing:
+            print("✓ SQLite database already present; indexes updated")
+        else:
+            print("✓ Created SQLite database")
 
 def install_dependencies():
     """Install required Python packages"""
     packages = [
         "fastapi",
         "uvicorn[standard]",
-        "pydantic<2",
+        "uvloop",
+        "httptools",
+        "pydantic>=2",
+        "orjson",
+        "msgspec",
         "httpx",
+        "aiohttp",
         "sqlalchemy>=2.0",
         "python-dotenv",
         "openai>=1.0.0"
     ]
     
     print("Installing dependencies...")
-    for package in packages:
-        subprocess.run([sys.executable, "-m", "pip", "install", package], 
-                      capture_output=True, text=True)
+    subprocess.run(
+        [sys.executable, "-m", "pip", "install",
+         "--no-input", "--disable-pip-version-check", "--quiet", *packages],
+        check=True,
+    )
     print("✓ Dependencies installed")
 
 async def main():
@@ -327,7 +411,12 @@ async def main():
     
     # Define service dependencies and environment variables
     services_config = [
-        ("tool-registry", {"DATABASE_URL": "sqlite:///./toolevo.db"}),
+        # Point every registry worker at the pre-created database so they don't race on create_all
+        ("tool-registry", {
+            "DATABASE_URL": f"sqlite:///{Path('toolevo.db').resolve()}",
+            "GATEWAY_BASE_URL": "http://localhost:9003",
+            "ORCHESTRATOR_BASE_URL": "http://localhost:9004"
+        }),
         ("weather-mock", {}),
         ("variability-engine", {"REGISTRY_BASE_URL": "http://localhost:9001"}),
         ("tool-gateway", {"REGISTRY_BASE_URL": "http://localhost:9001"}),
@@ -347,7 +436,7 @@ async def main():
     
     # Wait for services to be healthy
     print("\nStep 4: Waiting for services to be healthy")
-    if manager.wait_for_services():
+    if await manager.wait_for_services():
         print("✓ All services are healthy")
     else:
         print("✗ Some services failed to start properly")
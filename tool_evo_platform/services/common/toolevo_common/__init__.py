@@ -0,0 +1,4 @@
+"""
+Helpers shared by the services that dispatch tool calls (tool-gateway and the
+orchestrator's DIRECT_DISPATCH path). Copied into both images at build time.
+"""
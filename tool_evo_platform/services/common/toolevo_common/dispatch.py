@@ -0,0 +1,118 @@
+import asyncio
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import aiohttp
+import orjson
+from fastapi import HTTPException
+
+
+class ToolResolver:
+    """
+    Per-process cache of registry /resolve_minimal lookups, keyed by slug.
+
+    Entries live for ttl_seconds. invalidate() only drops them in the worker
+    that received the call, so with several workers ttl_seconds is the real
+    bound on how long a superseded version keeps being served.
+    """
+
+    def __init__(self, registry_base_url: str, ttl_seconds: float):
+        self.registry_base_url = registry_base_url
+        self.ttl_seconds = ttl_seconds
+        # slug -> (expires_at, resolved tool + version from the registry)
+        self._cache: Dict[str, Tuple[float, Dict[str, Any]]] = {}
+
+    async def resolve(self, session: aiohttp.ClientSession, slug: str) -> Dict[str, Any]:
+        cached = self._cache.get(slug)
+        if cached is not None and cached[0] > time.monotonic():
+            return cached[1]
+
+        async with session.get(
+            f"{self.registry_base_url}/resolve_minimal", params={"slug": slug}
+        ) as r:
+            if r.status != 200:
+                raise HTTPException(
+                    status_code=r.status,
+                    detail=f"Failed to resolve tool: {await r.text()}",
+                )
+            resolved = await r.json(loads=orjson.loads)
+
+        self._cache[slug] = (time.monotonic() + self.ttl_seconds, resolved)
+        return resolved
+
+    def invalidate(self, slug: Optional[str] = None):
+        if slug is None:
+            self._cache.clear()
+        else:
+            self._cache.pop(slug, None)
+
+
+def query_params(data: Dict[str, Any]) -> List[Tuple[str, str]]:
+    """
+    Encode tool input as query params. aiohttp only accepts str/int/float
+    values, so booleans, None and lists are flattened the same way httpx did.
+    """
+    params = []
+    for key, value in data.items():
+        values = value if isinstance(value, (list, tuple)) else [value]
+        for v in values:
+            if v is True:
+                v = "true"
+            elif v is False:
+                v = "false"
+            elif v is None:
+                v = ""
+            params.append((key, str(v)))
+    return params
+
+
+async def call_tool_endpoint(
+    session: aiohttp.ClientSession, resolved: Dict[str, Any], tool_input: Dict[str, Any]
+) -> Dict[str, Any]:
+    """
+    Call the endpoint of a resolved tool version (currently HTTP only) and
+    return {tool, version, tool_status_code, result}.
+    """
+    version = resolved.get("version") or {}
+    endpoint_url = version.get("endpoint_url")
+    endpoint_method = (version.get("endpoint_method") or "POST").upper()
+    protocol = version.get("endpoint_protocol", "http")
+
+    if not endpoint_url:
+        raise HTTPException(status_code=500, detail="Tool endpoint_url is not set")
+
+    if not endpoint_url.startswith("http"):
+        endpoint_url = f"{protocol}://{endpoint_url}"
+
+    if endpoint_method == "GET":
+        request_ctx = session.get(endpoint_url, params=query_params(tool_input))
+    elif endpoint_method == "POST":
+        request_ctx = session.post(endpoint_url, json=tool_input)
+    else:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Unsupported endpoint_method: {endpoint_method}",
+        )
+
+    try:
+        async with request_ctx as tool_resp:
+            tool_status_code = tool_resp.status
+            tool_body = await tool_resp.read()
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        raise HTTPException(
+            status_code=502,
+            detail=f"Error calling tool endpoint: {e!r}",
+        )
+
+    # Attempt to parse JSON; if it fails, return text
+    try:
+        tool_data = orjson.loads(tool_body)
+    except ValueError:
+        tool_data = {"raw": tool_body.decode(errors="replace")}
+
+    return {
+        "tool": resolved.get("tool"),
+        "version": version,
+        "tool_status_code": tool_status_code,
+        "result": tool_data,
+    }
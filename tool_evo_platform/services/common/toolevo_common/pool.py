@@ -0,0 +1,20 @@
+import asyncio
+
+import aiohttp
+
+
+async def _ping(session: aiohttp.ClientSession, base_url: str):
+    async with session.get(f"{base_url}/health") as r:
+        await r.read()
+
+
+async def prewarm_pool(session: aiohttp.ClientSession, connections: int, *base_urls: str):
+    """
+    Open `connections` keep-alive connections per downstream in parallel so the
+    first burst of requests skips TCP setup. Downstreams that are not up yet
+    are ignored.
+    """
+    await asyncio.gather(
+        *[_ping(session, url) for url in base_urls for _ in range(connections)],
+        return_exceptions=True,
+    )
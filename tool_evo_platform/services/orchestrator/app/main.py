@@ -1,24 +1,60 @@
-import json
 import os
-from typing import Any, Dict, List
+import time
+from typing import Any, Dict, List, Optional, Tuple
 
-import httpx
-from fastapi import FastAPI, HTTPException
+import aiohttp
+import orjson
+from fastapi import FastAPI, HTTPException, Query
+from fastapi.responses import ORJSONResponse
 from pydantic import BaseModel, Field
 
+from toolevo_common.dispatch import ToolResolver, call_tool_endpoint
+from toolevo_common.pool import prewarm_pool
+
 GATEWAY_BASE_URL = os.getenv("GATEWAY_BASE_URL", "http://localhost:8003")
 REGISTRY_BASE_URL = os.getenv("REGISTRY_BASE_URL", "http://localhost:8001")
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 
+# When enabled, /execute resolves the tool itself and calls its endpoint
+# directly instead of going through the gateway (skips two HTTP hops).
+# Resolutions are then cached per worker like in the gateway, so a version
+# change can keep being served the old version for up to
+# RESOLVE_CACHE_TTL_SECONDS. Setting ORCHESTRATOR_BASE_URL on the registry makes
+# it call /cache/invalidate here, but that only clears the worker it lands on.
+DIRECT_DISPATCH = os.getenv("DIRECT_DISPATCH", "0") == "1"
+RESOLVE_CACHE_TTL_SECONDS = float(os.getenv("RESOLVE_CACHE_TTL_SECONDS", "5"))
+TOOLS_CACHE_TTL_SECONDS = float(os.getenv("TOOLS_CACHE_TTL_SECONDS", "30"))
+# Keep-alive connections opened per downstream at startup
+POOL_PREWARM_CONNECTIONS = int(os.getenv("POOL_PREWARM_CONNECTIONS", "10"))
+
 # Optional LLM client for NL endpoints
 try:
-    from openai import OpenAI
+    from openai import AsyncOpenAI
 
-    llm_client = OpenAI(api_key=OPENAI_API_KEY) if OPENAI_API_KEY else None
+    llm_client = AsyncOpenAI(api_key=OPENAI_API_KEY) if OPENAI_API_KEY else None
 except ImportError:
     llm_client = None
 
-app = FastAPI(title="Orchestrator Service (LLM + Tool Router)")
+app = FastAPI(title="Orchestrator Service (LLM + Tool Router)", default_response_class=ORJSONResponse)
+
+# Shared outbound session so calls to the gateway/registry reuse keep-alive connections
+http_session: Optional[aiohttp.ClientSession] = None
+
+
+@app.on_event("startup")
+async def startup():
+    global http_session
+    http_session = aiohttp.ClientSession(
+        connector=aiohttp.TCPConnector(limit=200, ttl_dns_cache=300, keepalive_timeout=30),
+        timeout=aiohttp.ClientTimeout(total=5),
+    )
+    await prewarm_pool(http_session, POOL_PREWARM_CONNECTIONS, GATEWAY_BASE_URL, REGISTRY_BASE_URL)
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    if http_session is not None:
+        await http_session.close()
 
 
 class ExecuteRequest(BaseModel):
@@ -52,28 +88,154 @@ def require_llm():
         )
 
 
+async def complete_json(
+    messages: List[Dict[str, str]], response_format: Dict[str, Any]
+) -> Dict[str, Any]:
+    """
+    Stream a JSON completion and return as soon as the buffered output parses,
+    instead of waiting for the stream to finish.
+    """
+    stream = await llm_client.chat.completions.create(
+        model="gpt-4o-mini",
+        messages=messages,
+        response_format=response_format,
+        stream=True,
+    )
+    parts: List[str] = []
+    try:
+        async for chunk in stream:
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if not delta:
+                continue
+            parts.append(delta)
+            if "}" in delta:
+                try:
+                    return orjson.loads("".join(parts))
+                except orjson.JSONDecodeError:
+                    pass  # object not closed yet
+    finally:
+        await stream.close()
+    return orjson.loads("".join(parts))
+
+
+async def call_gateway(slug: str, tool_input: Dict[str, Any]) -> Dict[str, Any]:
+    async with http_session.post(
+        f"{GATEWAY_BASE_URL}/call_tool",
+        json={"slug": slug, "input": tool_input},
+    ) as r:
+        if r.status != 200:
+            raise HTTPException(status_code=r.status, detail=await r.text())
+        return await r.json(loads=orjson.loads)
+
+
+resolver = ToolResolver(REGISTRY_BASE_URL, RESOLVE_CACHE_TTL_SECONDS)
+
+
+async def dispatch_tool(slug: str, tool_input: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    In-process equivalent of the gateway's /call_tool, returning the same shape.
+    """
+    resolved = await resolver.resolve(http_session, slug)
+    return await call_tool_endpoint(http_session, resolved, tool_input)
+
+
 @app.post("/execute")
 async def execute(req: ExecuteRequest):
     """
     Simple orchestrator:
 
     - For explicit tool calls: you already know the slug + args.
-    - Just forwards to the gateway.
+    - Forwards to the gateway, or calls the tool directly when DIRECT_DISPATCH=1.
     """
-    async with httpx.AsyncClient() as client:
-        r = await client.post(
-            f"{GATEWAY_BASE_URL}/call_tool",
-            json={"slug": req.slug, "input": req.input},
-        )
-    if r.status_code != 200:
-        raise HTTPException(status_code=r.status_code, detail=r.text)
+    if DIRECT_DISPATCH:
+        gateway_response = await dispatch_tool(req.slug, req.input)
+    else:
+        gateway_response = await call_gateway(req.slug, req.input)
     return {
         "orchestrator": "ok",
         "mode": "direct",
-        "gateway_response": r.json(),
+        "gateway_response": gateway_response,
     }
 
 
+# Static prompts come first in the message list so the provider can reuse its
+# cached prefix across calls.
+NL_EXECUTE_SYSTEM_PROMPT = (
+    "You are a tool argument builder. "
+    "Given a user request and a tool slug, you MUST output ONLY a JSON object "
+    "for the tool input parameters, with no explanation or extra text."
+)
+
+NL_ROUTE_SYSTEM_PROMPT = (
+    "You are a routing controller for tools.\n"
+    "You are given a list of tools (with slug, name, description) and a user request.\n"
+    "Your job is to:\n"
+    "1) Decide which single tool (if any) is best suited to handle the request.\n"
+    "2) Construct a JSON object with arguments for that tool.\n\n"
+    "Return ONLY a JSON object with the following keys:\n"
+    "{\n"
+    "  \"slug\": string | null,  // chosen tool slug or null if none fits\n"
+    "  \"args\": object          // JSON args to send to this tool ({} if slug is null)\n"
+    "}\n"
+    "Do not include any explanation, only valid JSON."
+)
+
+
+def _supports_strict(schema: Dict[str, Any]) -> bool:
+    """
+    OpenAI strict structured outputs need every object to list all of its
+    properties as required and forbid additional properties.
+    """
+    if schema.get("type") == "object":
+        props = schema.get("properties", {})
+        if schema.get("additionalProperties") is not False:
+            return False
+        if set(schema.get("required", [])) != set(props):
+            return False
+        return all(_supports_strict(p) for p in props.values())
+    if schema.get("type") == "array":
+        return _supports_strict(schema.get("items", {}))
+    return True
+
+
+def build_input_format(input_schema: Dict[str, Any]) -> Dict[str, Any]:
+    if input_schema.get("type") != "object":
+        return {"type": "json_object"}
+    return {
+        "type": "json_schema",
+        "json_schema": {
+            "name": "tool_input",
+            "schema": input_schema,
+            "strict": _supports_strict(input_schema),
+        },
+    }
+
+
+# slug -> (expires_at, response_format built from the active version's input_schema)
+_input_format_cache: Dict[str, Tuple[float, Dict[str, Any]]] = {}
+
+
+async def get_input_format(slug: str) -> Dict[str, Any]:
+    cached = _input_format_cache.get(slug)
+    if cached is not None and cached[0] > time.monotonic():
+        return cached[1]
+
+    async with http_session.get(f"{REGISTRY_BASE_URL}/resolve", params={"slug": slug}) as r:
+        if r.status != 200:
+            raise HTTPException(
+                status_code=r.status,
+                detail=f"Failed to resolve tool: {await r.text()}",
+            )
+        resolved = await r.json(loads=orjson.loads)
+
+    version = resolved.get("version") or {}
+    response_format = build_input_format(version.get("input_schema") or {})
+    _input_format_cache[slug] = (time.monotonic() + RESOLVE_CACHE_TTL_SECONDS, response_format)
+    return response_format
+
+
 @app.post("/nl_execute")
 async def nl_execute(req: NLExecuteRequest):
     """
@@ -84,11 +246,9 @@ async def nl_execute(req: NLExecuteRequest):
     """
     require_llm()
 
-    system_prompt = (
-        "You are a tool argument builder. "
-        "Given a user request and a tool slug, you MUST output ONLY a JSON object "
-        "for the tool input parameters, with no explanation or extra text."
-    )
+    # Constrain the output to the tool's own input schema
+    response_format = await get_input_format(req.slug)
+
     user_prompt = (
         f"Tool slug: {req.slug}\n"
         f"User request: {req.query}\n"
@@ -96,38 +256,81 @@ async def nl_execute(req: NLExecuteRequest):
     )
 
     try:
-        completion = llm_client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": system_prompt},
+        tool_args = await complete_json(
+            [
+                {"role": "system", "content": NL_EXECUTE_SYSTEM_PROMPT},
                 {"role": "user", "content": user_prompt},
             ],
-            response_format={"type": "json_object"},
+            response_format=response_format,
         )
-        content = completion.choices[0].message.content
-        tool_args = json.loads(content)
     except Exception as e:
         raise HTTPException(
             status_code=500,
             detail=f"Error calling LLM or parsing its response: {e}",
         )
 
-    async with httpx.AsyncClient() as client:
-        r = await client.post(
-            f"{GATEWAY_BASE_URL}/call_tool",
-            json={"slug": req.slug, "input": tool_args},
-        )
-    if r.status_code != 200:
-        raise HTTPException(status_code=r.status_code, detail=r.text)
+    gateway_response = await call_gateway(req.slug, tool_args)
 
     return {
         "orchestrator": "ok",
         "mode": "llm-single-tool",
         "tool_input": tool_args,
-        "gateway_response": r.json(),
+        "gateway_response": gateway_response,
     }
 
 
+# (expires_at, registry ETag, tools, tools_json prompt fragment)
+_tools_cache: Optional[Tuple[float, Optional[str], List[ToolSummary], str]] = None
+
+
+async def get_tools() -> Tuple[List[ToolSummary], str]:
+    """
+    Registry tool list plus its serialized prompt fragment. Served from memory
+    for TOOLS_CACHE_TTL_SECONDS, then revalidated against the registry's ETag so
+    the list is only rebuilt when the tools table actually changed.
+    """
+    global _tools_cache
+    now = time.monotonic()
+    if _tools_cache is not None and _tools_cache[0] > now:
+        return _tools_cache[2], _tools_cache[3]
+
+    headers = {}
+    if _tools_cache is not None and _tools_cache[1]:
+        headers["If-None-Match"] = _tools_cache[1]
+
+    async with http_session.get(f"{REGISTRY_BASE_URL}/tools", headers=headers) as r:
+        if r.status == 304 and _tools_cache is not None:
+            _, etag, tools, tools_json = _tools_cache
+            _tools_cache = (now + TOOLS_CACHE_TTL_SECONDS, etag, tools, tools_json)
+            return tools, tools_json
+        if r.status != 200:
+            raise HTTPException(
+                status_code=500,
+                detail=f"Failed to fetch tools from registry: {await r.text()}",
+            )
+        etag = r.headers.get("ETag")
+        tools_raw = await r.json(loads=orjson.loads)
+
+    # Registry output is trusted, so skip field validation
+    tools: List[ToolSummary] = [
+        ToolSummary.model_construct(
+            slug=t["slug"],
+            display_name=t.get("display_name", t["slug"]),
+            description=t.get("description"),
+        )
+        for t in tools_raw
+    ]
+    tools_json = orjson.dumps([t.model_dump() for t in tools]).decode()
+
+    _tools_cache = (now + TOOLS_CACHE_TTL_SECONDS, etag, tools, tools_json)
+    return tools, tools_json
+
+
+def invalidate_tools_cache():
+    global _tools_cache
+    _tools_cache = None
+
+
 @app.post("/nl_route")
 async def nl_route(req: NLRouteRequest):
     """
@@ -141,37 +344,8 @@ async def nl_route(req: NLRouteRequest):
     """
     require_llm()
 
-    # 1. Fetch tools from registry
-    async with httpx.AsyncClient() as client:
-        r = await client.get(f"{REGISTRY_BASE_URL}/tools")
-    if r.status_code != 200:
-        raise HTTPException(status_code=500, detail=f"Failed to fetch tools from registry: {r.text}")
-
-    tools_raw = r.json()
-    tools: List[ToolSummary] = [
-        ToolSummary(
-            slug=t["slug"],
-            display_name=t.get("display_name", t["slug"]),
-            description=t.get("description"),
-        )
-        for t in tools_raw
-    ]
-
-    tools_json = json.dumps([t.dict() for t in tools], ensure_ascii=False)
-
-    system_prompt = (
-        "You are a routing controller for tools.\n"
-        "You are given a list of tools (with slug, name, description) and a user request.\n"
-        "Your job is to:\n"
-        "1) Decide which single tool (if any) is best suited to handle the request.\n"
-        "2) Construct a JSON object with arguments for that tool.\n\n"
-        "Return ONLY a JSON object with the following keys:\n"
-        "{\n"
-        "  \"slug\": string | null,  // chosen tool slug or null if none fits\n"
-        "  \"args\": object          // JSON args to send to this tool ({} if slug is null)\n"
-        "}\n"
-        "Do not include any explanation, only valid JSON."
-    )
+    # 1. Fetch tools from registry (cached, see get_tools)
+    tools, tools_json = await get_tools()
 
     user_prompt = (
         f"Available tools (JSON list):\n{tools_json}\n\n"
@@ -180,16 +354,13 @@ async def nl_route(req: NLRouteRequest):
     )
 
     try:
-        completion = llm_client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": system_prompt},
+        parsed = await complete_json(
+            [
+                {"role": "system", "content": NL_ROUTE_SYSTEM_PROMPT},
                 {"role": "user", "content": user_prompt},
             ],
             response_format={"type": "json_object"},
         )
-        content = completion.choices[0].message.content
-        parsed = json.loads(content)
         chosen_slug = parsed.get("slug")
         args = parsed.get("args", {})
     except Exception as e:
@@ -203,7 +374,7 @@ async def nl_route(req: NLRouteRequest):
         return {
             "orchestrator": "ok",
             "mode": "llm-router-no-tool",
-            "available_tools": [t.dict() for t in tools],
+            "available_tools": [t.model_dump() for t in tools],
             "router_output": {
                 "slug": None,
                 "args": args,
@@ -211,23 +382,38 @@ async def nl_route(req: NLRouteRequest):
         }
 
     # 3. Call the gateway with the chosen slug + args
-    async with httpx.AsyncClient() as client:
-        r = await client.post(
-            f"{GATEWAY_BASE_URL}/call_tool",
-            json={"slug": chosen_slug, "input": args},
-        )
-    if r.status_code != 200:
-        raise HTTPException(status_code=r.status_code, detail=r.text)
+    try:
+        gateway_response = await call_gateway(chosen_slug, args)
+    except HTTPException as e:
+        if e.status_code == 404:
+            # The cached tool list is likely stale; refetch on the next query.
+            invalidate_tools_cache()
+        raise
 
     return {
         "orchestrator": "ok",
         "mode": "llm-router",
         "chosen_tool": chosen_slug,
         "tool_input": args,
-        "gateway_response": r.json(),
+        "gateway_response": gateway_response,
     }
 
 
+@app.post("/cache/invalidate")
+async def invalidate_cache(slug: Optional[str] = Query(None, description="Slug to drop; all if omitted")):
+    """
+    Drop this worker's cached registry resolutions and input formats. Called by
+    the registry when versions change; other workers pick the change up once
+    their entries expire (RESOLVE_CACHE_TTL_SECONDS).
+    """
+    resolver.invalidate(slug)
+    if slug is None:
+        _input_format_cache.clear()
+    else:
+        _input_format_cache.pop(slug, None)
+    return {"invalidated": slug or "all"}
+
+
 @app.get("/health")
 async def health():
     return {
@@ -235,4 +421,5 @@ async def health():
         "gateway_base_url": GATEWAY_BASE_URL,
         "registry_base_url": REGISTRY_BASE_URL,
         "llm_enabled": llm_client is not None,
+        "direct_dispatch": DIRECT_DISPATCH,
     }
@@ -1,79 +1,99 @@
 import os
-from typing import Any, Dict
+from typing import Any, Dict, Optional
 
-import httpx
-from fastapi import FastAPI, HTTPException
+import aiohttp
+import orjson
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.responses import ORJSONResponse
 from pydantic import BaseModel
 
+from toolevo_common.dispatch import ToolResolver, call_tool_endpoint
+from toolevo_common.pool import prewarm_pool
+
 REGISTRY_BASE_URL = os.getenv("REGISTRY_BASE_URL", "http://localhost:8001")
+# Resolutions are cached per worker; /cache/invalidate only reaches the worker
+# that receives it, so this TTL bounds how long other workers serve an old version.
+RESOLVE_CACHE_TTL_SECONDS = float(os.getenv("RESOLVE_CACHE_TTL_SECONDS", "5"))
+# Keep-alive connections opened to the registry at startup
+POOL_PREWARM_CONNECTIONS = int(os.getenv("POOL_PREWARM_CONNECTIONS", "10"))
+
+app = FastAPI(title="Tool Gateway Service", default_response_class=ORJSONResponse)
+
+# Shared outbound session so registry/tool calls reuse keep-alive connections
+http_session: Optional[aiohttp.ClientSession] = None
+
+
+@app.on_event("startup")
+async def startup():
+    global http_session
+    http_session = aiohttp.ClientSession(
+        connector=aiohttp.TCPConnector(limit=200, ttl_dns_cache=300, keepalive_timeout=30),
+        timeout=aiohttp.ClientTimeout(total=5),
+    )
+    await prewarm_pool(http_session, POOL_PREWARM_CONNECTIONS, REGISTRY_BASE_URL)
+
 
-app = FastAPI(title="Tool Gateway Service")
+@app.on_event("shutdown")
+async def shutdown():
+    if http_session is not None:
+        await http_session.close()
 
 
+# Documents the /call_tool body; the handler parses it directly (see call_tool).
 class ToolCallRequest(BaseModel):
     slug: str
     input: Dict[str, Any]
 
 
-@app.post("/call_tool")
-async def call_tool(req: ToolCallRequest):
+resolver = ToolResolver(REGISTRY_BASE_URL, RESOLVE_CACHE_TTL_SECONDS)
+
+
+@app.post(
+    "/call_tool",
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {"application/json": {"schema": ToolCallRequest.model_json_schema()}},
+        }
+    },
+)
+async def call_tool(request: Request):
     """
     1. Resolve tool + active version from registry.
     2. Call the underlying endpoint (currently HTTP only).
     3. Return combined response.
-    """
-
-    # 1. Resolve tool + version
-    async with httpx.AsyncClient() as client:
-        r = await client.get(f"{REGISTRY_BASE_URL}/resolve", params={"slug": req.slug})
-        if r.status_code != 200:
-            raise HTTPException(
-                status_code=r.status_code,
-                detail=f"Failed to resolve tool: {r.text}",
-            )
-        resolved = r.json()
-
-    version = resolved.get("version") or {}
-    endpoint_url = version.get("endpoint_url")
-    endpoint_method = (version.get("endpoint_method") or "POST").upper()
-    protocol = version.get("endpoint_protocol", "http")
 
-    if not endpoint_url:
-        raise HTTPException(status_code=500, detail="Tool endpoint_url is not set")
-
-    if not endpoint_url.startswith("http"):
-        endpoint_url = f"{protocol}://{endpoint_url}"
-
-    # 2. Call the underlying endpoint
+    The body is parsed with orjson and checked by hand rather than through a
+    pydantic model, since this is the hottest path in the platform.
+    """
     try:
-        async with httpx.AsyncClient() as client:
-            if endpoint_method == "GET":
-                tool_resp = await client.get(endpoint_url, params=req.input)
-            elif endpoint_method == "POST":
-                tool_resp = await client.post(endpoint_url, json=req.input)
-            else:
-                raise HTTPException(
-                    status_code=500,
-                    detail=f"Unsupported endpoint_method: {endpoint_method}",
-                )
-    except httpx.RequestError as e:
+        body = orjson.loads(await request.body())
+        slug = body["slug"]
+        tool_input = body["input"]
+    except (orjson.JSONDecodeError, KeyError, TypeError):
+        slug = tool_input = None
+    if not isinstance(slug, str) or not isinstance(tool_input, dict):
         raise HTTPException(
-            status_code=502,
-            detail=f"Error calling tool endpoint: {e}",
+            status_code=422,
+            detail="Request body must be a JSON object with 'slug' (string) and 'input' (object)",
         )
 
-    # Attempt to parse JSON; if it fails, return text
-    try:
-        tool_data = tool_resp.json()
-    except ValueError:
-        tool_data = {"raw": tool_resp.text}
-
-    return {
-        "tool": resolved.get("tool"),
-        "version": version,
-        "tool_status_code": tool_resp.status_code,
-        "result": tool_data,
-    }
+    # 1. Resolve tool + version (cached per slug for RESOLVE_CACHE_TTL_SECONDS)
+    resolved = await resolver.resolve(http_session, slug)
+
+    # 2. Call the underlying endpoint
+    return await call_tool_endpoint(http_session, resolved, tool_input)
+
+
+@app.post("/cache/invalidate")
+async def invalidate_cache(slug: Optional[str] = Query(None, description="Slug to drop; all if omitted")):
+    """
+    Drop this worker's cached registry resolutions. Called by the registry when
+    versions change; other workers pick the change up once their entries expire
+    (RESOLVE_CACHE_TTL_SECONDS).
+    """
+    resolver.invalidate(slug)
+    return {"invalidated": slug or "all"}
 
 
 @app.get("/health")
@@ -1,15 +1,131 @@
-from datetime import datetime
-from typing import List, Optional
+import os
+import time
+import uuid
+from typing import Any, Dict, List, Optional, Tuple
 
-from fastapi import Depends, FastAPI, HTTPException, Query
-from sqlalchemy.orm import Session
+import httpx
+import orjson
+from fastapi import BackgroundTasks, Depends, FastAPI, HTTPException, Query, Request, Response
+from fastapi.responses import ORJSONResponse
+from sqlalchemy import and_, bindparam, func, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, selectinload
 
 from .db import Base, engine, get_db
 from . import models, schemas
 
 Base.metadata.create_all(bind=engine)
 
-app = FastAPI(title="Tool Registry Service")
+app = FastAPI(title="Tool Registry Service", default_response_class=ORJSONResponse)
+
+# Optional: services caching resolutions (gateway, and the orchestrator when it
+# runs with DIRECT_DISPATCH) to notify when a tool's active version may have changed
+GATEWAY_BASE_URL = os.getenv("GATEWAY_BASE_URL")
+ORCHESTRATOR_BASE_URL = os.getenv("ORCHESTRATOR_BASE_URL")
+CACHE_NOTIFY_URLS = [url for url in (GATEWAY_BASE_URL, ORCHESTRATOR_BASE_URL) if url]
+RESOLVE_CACHE_TTL_SECONDS = float(os.getenv("RESOLVE_CACHE_TTL_SECONDS", "5"))
+
+# Activating a version demotes the previous active one in the same transaction,
+# so ix_tool_versions_active only trips when two activations race.
+ACTIVE_CONFLICT = "Another version of this tool was activated concurrently; retry"
+
+_TOOL_COLUMNS = tuple(models.Tool.__table__.c)
+_VERSION_COLUMNS = tuple(models.ToolVersion.__table__.c)
+
+# Just what the gateway needs to dispatch a call (no schemas).
+_MINIMAL_TOOL_COLUMNS = (models.Tool.id, models.Tool.slug)
+_MINIMAL_VERSION_COLUMNS = (
+    models.ToolVersion.id,
+    models.ToolVersion.version,
+    models.ToolVersion.endpoint_protocol,
+    models.ToolVersion.endpoint_method,
+    models.ToolVersion.endpoint_url,
+)
+
+
+def _resolve_stmt(tool_columns, version_columns):
+    """
+    Tool by slug + its active version (if any) in one round-trip. The outer
+    join lets us tell "unknown slug" apart from "no active version".
+    ix_tool_versions_active allows at most one active version, but databases
+    created before it can still hold several, so the newest one wins; with the
+    index in place the ORDER BY is free.
+    """
+    return (
+        select(*tool_columns, *version_columns)
+        .outerjoin(
+            models.ToolVersion,
+            and_(
+                models.ToolVersion.tool_id == models.Tool.id,
+                models.ToolVersion.status == models.ToolStatus.active,
+            ),
+        )
+        .where(models.Tool.slug == bindparam("slug"))
+        .order_by(models.ToolVersion.created_at.desc())
+        .limit(1)
+    )
+
+
+_RESOLVE_STMT = _resolve_stmt(_TOOL_COLUMNS, _VERSION_COLUMNS)
+_RESOLVE_MINIMAL_STMT = _resolve_stmt(_MINIMAL_TOOL_COLUMNS, _MINIMAL_VERSION_COLUMNS)
+
+# (endpoint, slug) -> (expires_at, response body) for /resolve. Only cleared on
+# the worker that takes a version write, so other workers can serve a superseded
+# version for up to RESOLVE_CACHE_TTL_SECONDS. /resolve_minimal, which the
+# gateway refetches through after an invalidation, bypasses it.
+_resolve_cache: Dict[Tuple[str, str], Tuple[float, Dict[str, Any]]] = {}
+
+
+def json_response(adapter, rows, **kwargs) -> Response:
+    """
+    Serialize ORM rows with a prebuilt schema TypeAdapter straight to JSON bytes,
+    skipping FastAPI's response_model validation and jsonable_encoder passes.
+    response_model stays on the routes for the OpenAPI docs.
+    """
+    body = adapter.dump_json(adapter.validate_python(rows, from_attributes=True))
+    return Response(content=body, media_type="application/json", **kwargs)
+
+
+def _is_active_conflict(e: IntegrityError) -> bool:
+    """
+    Whether e was raised by ix_tool_versions_active. Postgres drivers report the
+    index name; SQLite only names the indexed column.
+    """
+    constraint = getattr(getattr(e.orig, "diag", None), "constraint_name", None)
+    if constraint is not None:
+        return constraint == "ix_tool_versions_active"
+    return str(e.orig) == "UNIQUE constraint failed: tool_versions.tool_id"
+
+
+def _demote_active(db: Session, tool_id: uuid.UUID, keep_id: Optional[uuid.UUID] = None):
+    """
+    Deprecate the tool's current active version (other than keep_id) so another
+    one can be activated in the same transaction without a gap.
+    """
+    stmt = (
+        update(models.ToolVersion)
+        .where(
+            models.ToolVersion.tool_id == tool_id,
+            models.ToolVersion.status == models.ToolStatus.active,
+        )
+        .values(status=models.ToolStatus.deprecated)
+        .execution_options(synchronize_session=False)
+    )
+    if keep_id is not None:
+        stmt = stmt.where(models.ToolVersion.id != keep_id)
+    db.execute(stmt)
+
+
+def notify_caches(slug: str):
+    """
+    Best-effort cache invalidation. Each call reaches a single worker of the
+    target service; the others (and any missed notification) rely on their TTL.
+    """
+    for base_url in CACHE_NOTIFY_URLS:
+        try:
+            httpx.post(f"{base_url}/cache/invalidate", params={"slug": slug}, timeout=2)
+        except httpx.HTTPError:
+            pass
 
 
 @app.post("/tools", response_model=schemas.ToolRead, status_code=201)
@@ -32,11 +148,27 @@ def create_tool(tool: schemas.ToolCreate, db: Session = Depends(get_db)):
     return db_tool
 
 
+def tools_etag(db: Session) -> str:
+    """
+    Weak ETag for the tools table, derived from its row count and latest update.
+    """
+    count, last_updated = db.execute(
+        select(func.count(models.Tool.id), func.max(models.Tool.updated_at))
+    ).one()
+    stamp = last_updated.isoformat() if last_updated else "0"
+    return f'W/"{count}-{stamp}"'
+
+
 @app.get("/tools", response_model=List[schemas.ToolRead])
 def list_tools(
+    request: Request,
     db: Session = Depends(get_db),
     search: Optional[str] = Query(None, description="Search by slug or display_name"),
 ):
+    etag = tools_etag(db)
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+
     q = db.query(models.Tool)
     if search:
         like = f"%{search}%"
@@ -44,19 +176,21 @@ def list_tools(
             (models.Tool.slug.ilike(like))
             | (models.Tool.display_name.ilike(like))
         )
-    return q.order_by(models.Tool.created_at.desc()).all()
+    tools = q.order_by(models.Tool.created_at.desc()).all()
+    return json_response(schemas.TOOL_LIST, tools, headers={"ETag": etag})
 
 
 @app.get("/tools/{tool_id}", response_model=schemas.ToolWithVersions)
-def get_tool(tool_id: str, db: Session = Depends(get_db)):
+def get_tool(tool_id: uuid.UUID, db: Session = Depends(get_db)):
     tool = (
         db.query(models.Tool)
+        .options(selectinload(models.Tool.versions))
         .filter(models.Tool.id == tool_id)
         .one_or_none()
     )
     if not tool:
         raise HTTPException(status_code=404, detail="Tool not found")
-    return tool
+    return json_response(schemas.TOOL_WITH_VERSIONS, tool)
 
 
 @app.post(
@@ -65,8 +199,9 @@ def get_tool(tool_id: str, db: Session = Depends(get_db)):
     status_code=201,
 )
 def create_tool_version(
-    tool_id: str,
+    tool_id: uuid.UUID,
     payload: schemas.ToolVersionCreate,
+    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db),
 ):
     tool = (
@@ -93,9 +228,20 @@ def create_tool_version(
         valid_from=payload.valid_from,
         valid_to=payload.valid_to,
     )
+    if payload.status == models.ToolStatus.active:
+        _demote_active(db, tool.id)
     db.add(db_version)
-    db.commit()
+    try:
+        db.commit()
+    except IntegrityError as e:
+        db.rollback()
+        if not _is_active_conflict(e):
+            raise
+        raise HTTPException(status_code=409, detail=ACTIVE_CONFLICT)
     db.refresh(db_version)
+    _resolve_cache.clear()
+    if CACHE_NOTIFY_URLS and db_version.status == models.ToolStatus.active:
+        background_tasks.add_task(notify_caches, tool.slug)
     return db_version
 
 
@@ -104,16 +250,22 @@ def create_tool_version(
     response_model=List[schemas.ToolVersionRead],
 )
 def list_tool_versions(
-    tool_id: str,
+    tool_id: uuid.UUID,
     status: Optional[models.ToolStatus] = Query(
         None, description="Filter by status"
     ),
+    ids: Optional[List[uuid.UUID]] = Query(
+        None, description="Only these version ids (repeat the parameter)"
+    ),
     db: Session = Depends(get_db),
 ):
     q = db.query(models.ToolVersion).filter(models.ToolVersion.tool_id == tool_id)
     if status:
         q = q.filter(models.ToolVersion.status == status)
-    return q.order_by(models.ToolVersion.created_at.desc()).all()
+    if ids:
+        q = q.filter(models.ToolVersion.id.in_(ids))
+    versions = q.order_by(models.ToolVersion.created_at.desc()).all()
+    return json_response(schemas.VERSION_LIST, versions)
 
 
 @app.get(
@@ -121,8 +273,8 @@ def list_tool_versions(
     response_model=schemas.ToolVersionRead,
 )
 def get_tool_version(
-    tool_id: str,
-    version_id: str,
+    tool_id: uuid.UUID,
+    version_id: uuid.UUID,
     db: Session = Depends(get_db),
 ):
     version = (
@@ -135,7 +287,7 @@ def get_tool_version(
     )
     if not version:
         raise HTTPException(status_code=404, detail="Tool version not found")
-    return version
+    return json_response(schemas.VERSION_READ, version)
 
 
 @app.patch(
@@ -143,56 +295,103 @@ def get_tool_version(
     response_model=schemas.ToolVersionRead,
 )
 def update_tool_version_status(
-    tool_id: str,
-    version_id: str,
+    tool_id: uuid.UUID,
+    version_id: uuid.UUID,
     status_update: schemas.StatusUpdate,
+    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db),
 ):
-    version = (
-        db.query(models.ToolVersion)
-        .filter(
+    # Single UPDATE ... RETURNING; updated_at is stamped by the column's onupdate.
+    stmt = (
+        update(models.ToolVersion)
+        .where(
             models.ToolVersion.tool_id == tool_id,
             models.ToolVersion.id == version_id,
         )
-        .one_or_none()
+        .values(status=status_update.status)
+        .returning(*_VERSION_COLUMNS)
+        .execution_options(synchronize_session=False)
     )
-    if not version:
+    if status_update.status == models.ToolStatus.active:
+        _demote_active(db, tool_id, keep_id=version_id)
+    try:
+        row = db.execute(stmt).mappings().one_or_none()
+    except IntegrityError as e:
+        db.rollback()
+        if not _is_active_conflict(e):
+            raise
+        raise HTTPException(status_code=409, detail=ACTIVE_CONFLICT)
+    if row is None:
+        db.rollback()
         raise HTTPException(status_code=404, detail="Tool version not found")
+    version = dict(row)
 
-    version.status = status_update.status
-    version.updated_at = datetime.utcnow()
+    slug = None
+    if CACHE_NOTIFY_URLS:
+        slug = db.scalar(select(models.Tool.slug).where(models.Tool.id == tool_id))
     db.commit()
-    db.refresh(version)
+    _resolve_cache.clear()
+    if slug:
+        background_tasks.add_task(notify_caches, slug)
     return version
 
 
+def _resolve(
+    db: Session, slug: str, stmt, tool_columns, version_columns, cache_key=None
+):
+    if cache_key is not None:
+        cached = _resolve_cache.get(cache_key)
+        if cached is not None and cached[0] > time.monotonic():
+            return cached[1]
+
+    row = db.execute(stmt, {"slug": slug}).first()
+    if row is None:
+        raise HTTPException(status_code=404, detail="Tool not found")
+
+    n_tool = len(tool_columns)
+    # Version columns are NULL when the tool has no active version
+    if row[n_tool] is None:
+        raise HTTPException(status_code=404, detail="No active version for this tool")
+
+    resolved = {
+        "tool": {c.key: v for c, v in zip(tool_columns, row[:n_tool])},
+        "version": {c.key: v for c, v in zip(version_columns, row[n_tool:])},
+    }
+    if cache_key is not None:
+        _resolve_cache[cache_key] = (time.monotonic() + RESOLVE_CACHE_TTL_SECONDS, resolved)
+    return resolved
+
+
 @app.get("/resolve")
 def resolve_tool(
     slug: str = Query(..., description="Tool slug"),
     db: Session = Depends(get_db),
 ):
-    tool = (
-        db.query(models.Tool)
-        .filter(models.Tool.slug == slug)
-        .one_or_none()
+    return _resolve(
+        db, slug, _RESOLVE_STMT, _TOOL_COLUMNS, _VERSION_COLUMNS, ("resolve", slug)
     )
-    if not tool:
-        raise HTTPException(status_code=404, detail="Tool not found")
 
-    # Choose the latest active version by created_at
-    version = (
-        db.query(models.ToolVersion)
-        .filter(
-            models.ToolVersion.tool_id == tool.id,
-            models.ToolVersion.status == models.ToolStatus.active,
-        )
-        .order_by(models.ToolVersion.created_at.desc())
-        .first()
+
+@app.get("/resolve_minimal")
+def resolve_tool_minimal(
+    slug: str = Query(..., description="Tool slug"),
+    db: Session = Depends(get_db),
+):
+    """
+    Like /resolve, but only returns the tool/version ids and the endpoint
+    fields needed to dispatch a call (no input/output schemas).
+
+    Not cached here: callers cache the result themselves and refetch after an
+    invalidation, which must see the committed active version.
+    """
+    return _resolve(
+        db, slug, _RESOLVE_MINIMAL_STMT, _MINIMAL_TOOL_COLUMNS, _MINIMAL_VERSION_COLUMNS
     )
-    if not version:
-        raise HTTPException(status_code=404, detail="No active version for this tool")
 
-    return {
-        "tool": schemas.ToolRead.from_orm(tool),
-        "version": schemas.ToolVersionRead.from_orm(version),
-    }
+
+_HEALTH = orjson.dumps({"status": "ok"})
+
+
+@app.get("/health")
+def health():
+    return Response(content=_HEALTH, media_type="application/json")
@@ -1,23 +1,45 @@
 import enum
 import uuid
-from datetime import datetime
 
-from sqlalchemy import Column, String, Text, DateTime, ForeignKey, Enum, JSON
+from sqlalchemy import Column, String, Text, DateTime, ForeignKey, Enum, JSON, Index, Numeric, Uuid, text
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.ext.compiler import compiles
 from sqlalchemy.orm import relationship
+from sqlalchemy.sql.expression import FunctionElement
 
 from .db import Base
 
 
+class utcnow(FunctionElement):
+    """
+    Database-side timestamp. Plain now() on Postgres; on SQLite CURRENT_TIMESTAMP
+    only has second resolution, which would tie versions created together.
+    """
+
+    type = DateTime(timezone=True)
+    inherit_cache = True
+
+
+@compiles(utcnow)
+def _utcnow_default(element, compiler, **kw):
+    return "now()"
+
+
+@compiles(utcnow, "sqlite")
+def _utcnow_sqlite(element, compiler, **kw):
+    return "(strftime('%Y-%m-%d %H:%M:%f', 'now'))"
+
+
 class Tool(Base):
     __tablename__ = "tools"
 
-    id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
+    id = Column(Uuid, primary_key=True, default=uuid.uuid4)
     slug = Column(String, unique=True, nullable=False, index=True)
     display_name = Column(String, nullable=False)
     description = Column(Text, nullable=True)
-    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=utcnow(), nullable=False)
     updated_at = Column(
-        DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False
+        DateTime(timezone=True), server_default=utcnow(), onupdate=utcnow(), nullable=False
     )
 
     versions = relationship("ToolVersion", back_populates="tool", cascade="all, delete-orphan")
@@ -30,33 +52,101 @@ class ToolStatus(str, enum.Enum):
     retired = "retired"
 
 
+class EndpointProtocol(str, enum.Enum):
+    http = "http"
+    https = "https"
+    grpc = "grpc"
+    internal = "internal"
+
+
+class EndpointMethod(str, enum.Enum):
+    GET = "GET"
+    POST = "POST"
+    PUT = "PUT"
+    PATCH = "PATCH"
+    DELETE = "DELETE"
+
+    @classmethod
+    def _missing_(cls, value):
+        # The gateway has always upper-cased methods; keep accepting "get" etc.
+        if isinstance(value, str):
+            return cls.__members__.get(value.upper())
+        return None
+
+
+class AuthType(str, enum.Enum):
+    none = "none"
+    api_key = "api_key"
+    bearer = "bearer"
+    basic = "basic"
+    oauth2 = "oauth2"
+
+
+class AuthKeyLocation(str, enum.Enum):
+    header = "header"
+    query = "query"
+    cookie = "cookie"
+
+
+# Postgres stores schemas as parsed, indexable jsonb; other dialects keep JSON.
+SchemaJSON = JSON().with_variant(JSONB(), "postgresql")
+
+
 class ToolVersion(Base):
     __tablename__ = "tool_versions"
 
-    id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
-    tool_id = Column(String, ForeignKey("tools.id"), nullable=False, index=True)
+    id = Column(Uuid, primary_key=True, default=uuid.uuid4)
+    tool_id = Column(Uuid, ForeignKey("tools.id"), nullable=False)
     version = Column(String, nullable=False)
-    status = Column(Enum(ToolStatus), default=ToolStatus.draft, nullable=False)
+    status = Column(
+        Enum(ToolStatus, create_constraint=True), default=ToolStatus.draft, nullable=False
+    )
 
-    input_schema = Column(JSON, nullable=False)
-    output_schema = Column(JSON, nullable=False)
+    input_schema = Column(SchemaJSON, nullable=False)
+    output_schema = Column(SchemaJSON, nullable=False)
 
-    endpoint_protocol = Column(String, nullable=False)  # "http", "https", "grpc", "internal"
-    endpoint_method = Column(String, nullable=True)     # "GET", "POST", ...
+    endpoint_protocol = Column(Enum(EndpointProtocol, create_constraint=True), nullable=False)
+    endpoint_method = Column(Enum(EndpointMethod, create_constraint=True), nullable=True)
     endpoint_url = Column(String, nullable=True)
 
-    auth_type = Column(String, nullable=False, default="none")
+    auth_type = Column(
+        Enum(AuthType, create_constraint=True), nullable=False, default=AuthType.none
+    )
     auth_key_name = Column(String, nullable=True)
-    auth_key_location = Column(String, nullable=True)
+    auth_key_location = Column(Enum(AuthKeyLocation, create_constraint=True), nullable=True)
 
-    cost_per_call_usd = Column(String, nullable=True)
+    cost_per_call_usd = Column(Numeric(12, 6), nullable=True)
 
-    valid_from = Column(DateTime, nullable=True)
-    valid_to = Column(DateTime, nullable=True)
+    valid_from = Column(DateTime(timezone=True), nullable=True)
+    valid_to = Column(DateTime(timezone=True), nullable=True)
 
-    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=utcnow(), nullable=False)
     updated_at = Column(
-        DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False
+        DateTime(timezone=True), server_default=utcnow(), onupdate=utcnow(), nullable=False
     )
 
     tool = relationship("Tool", back_populates="versions")
+
+    __table_args__ = (
+        # Per-tool status filters, newest first
+        Index("ix_tv_tool_status_created", "tool_id", "status", "created_at"),
+        # Version listing: filter by tool, newest first
+        Index("ix_tool_versions_tool_id_created", "tool_id", "created_at"),
+        # At most one active version per tool; also the /resolve lookup path
+        Index(
+            "ix_tool_versions_active",
+            "tool_id",
+            unique=True,
+            sqlite_where=text("status = 'active'"),
+            postgresql_where=text("status = 'active'"),
+        ),
+        # Cost-based routing
+        Index("ix_tool_versions_cost", "cost_per_call_usd"),
+        # Schema containment lookups (jsonb @> / ?) on Postgres only
+        Index(
+            "ix_tool_versions_input_schema_gin", "input_schema", postgresql_using="gin"
+        ).ddl_if(dialect="postgresql"),
+        Index(
+            "ix_tool_versions_output_schema_gin", "output_schema", postgresql_using="gin"
+        ).ddl_if(dialect="postgresql"),
+    )
@@ -1,9 +1,21 @@
+import uuid
 from datetime import datetime
-from typing import Any, Dict, List, Optional
+from decimal import Decimal
+from typing import Annotated, Any, Dict, List, Optional
 
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict, Field, PlainSerializer, TypeAdapter
 
-from .models import ToolStatus
+from .models import AuthKeyLocation, AuthType, EndpointMethod, EndpointProtocol, ToolStatus
+
+
+# Stored as NUMERIC(12, 6), so values that don't fit are a 422 rather than a
+# database error; serialized as a JSON number so the response models agree
+# with the raw rows returned by /resolve.
+Cost = Annotated[
+    Decimal,
+    Field(max_digits=12, decimal_places=6),
+    PlainSerializer(float, return_type=float, when_used="json"),
+]
 
 
 class ToolBase(BaseModel):
@@ -17,12 +29,11 @@ class ToolCreate(ToolBase):
 
 
 class ToolRead(ToolBase):
-    id: str
+    id: uuid.UUID
     created_at: datetime
     updated_at: datetime
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 class ToolVersionBase(BaseModel):
@@ -31,15 +42,15 @@ class ToolVersionBase(BaseModel):
     input_schema: Dict[str, Any]
     output_schema: Dict[str, Any]
 
-    endpoint_protocol: str
-    endpoint_method: Optional[str] = None
+    endpoint_protocol: EndpointProtocol
+    endpoint_method: Optional[EndpointMethod] = None
     endpoint_url: Optional[str] = None
 
-    auth_type: str = "none"
+    auth_type: AuthType = AuthType.none
     auth_key_name: Optional[str] = None
-    auth_key_location: Optional[str] = None
+    auth_key_location: Optional[AuthKeyLocation] = None
 
-    cost_per_call_usd: Optional[str] = None
+    cost_per_call_usd: Optional[Cost] = None
     valid_from: Optional[datetime] = None
     valid_to: Optional[datetime] = None
 
@@ -49,13 +60,12 @@ class ToolVersionCreate(ToolVersionBase):
 
 
 class ToolVersionRead(ToolVersionBase):
-    id: str
-    tool_id: str
+    id: uuid.UUID
+    tool_id: uuid.UUID
     created_at: datetime
     updated_at: datetime
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 class ToolWithVersions(ToolRead):
@@ -64,3 +74,10 @@ class ToolWithVersions(ToolRead):
 
 class StatusUpdate(BaseModel):
     status: ToolStatus
+
+
+# Built once at import; read routes serialize ORM rows through these directly.
+TOOL_LIST = TypeAdapter(List[ToolRead])
+TOOL_WITH_VERSIONS = TypeAdapter(ToolWithVersions)
+VERSION_READ = TypeAdapter(ToolVersionRead)
+VERSION_LIST = TypeAdapter(List[ToolVersionRead])
@@ -1,14 +1,141 @@
+import asyncio
 import os
+import time
+import uuid
+from collections import OrderedDict, defaultdict
 from enum import Enum
-from typing import Any, Dict, Optional
+from typing import Any, Dict, Optional, Set, Tuple
 
 import httpx
-from fastapi import FastAPI
-from pydantic import BaseModel
+import msgspec
+import orjson
+from fastapi import FastAPI, HTTPException, Request, Response
+from fastapi.responses import ORJSONResponse
 
 REGISTRY_BASE_URL = os.getenv("REGISTRY_BASE_URL", "http://localhost:8001")
+VERSION_CACHE_TTL_SECONDS = float(os.getenv("VERSION_CACHE_TTL_SECONDS", "60"))
+VERSION_CACHE_SIZE = int(os.getenv("VERSION_CACHE_SIZE", "2048"))
+# Concurrent version lookups within this window share one registry request
+VERSION_BATCH_WINDOW_MS = float(os.getenv("VERSION_BATCH_WINDOW_MS", "5"))
+VERSION_BATCH_MAX = int(os.getenv("VERSION_BATCH_MAX", "100"))
+# Multiplex registry requests over HTTP/2. Needs an h2-capable registry front
+# (TLS proxy); uvicorn itself only speaks HTTP/1.1, so httpx falls back there.
+REGISTRY_HTTP2 = os.getenv("REGISTRY_HTTP2", "0") == "1"
 
-app = FastAPI(title="Variability Engine (Stub)")
+app = FastAPI(title="Variability Engine (Stub)", default_response_class=ORJSONResponse)
+
+# Shared registry client so version lookups reuse keep-alive connections
+http_client: Optional[httpx.AsyncClient] = None
+
+
+class VersionBatcher:
+    """
+    Coalesces version lookups issued within a short window into one
+    GET /tools/{tool_id}/versions?ids=... per tool. Callers get a future that
+    resolves to the version dict, or None if the registry does not have it.
+    """
+
+    def __init__(self, client: httpx.AsyncClient, window_ms: float, max_batch: int):
+        self._client = client
+        self._window = window_ms / 1000
+        self._max_batch = max_batch
+        self._pending: Dict[Tuple[str, str], asyncio.Future] = {}
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._flushes: Set[asyncio.Task] = set()
+
+    def fetch(self, tool_id: str, version_id: str) -> asyncio.Future:
+        loop = asyncio.get_running_loop()
+        key = (tool_id, version_id)
+        future = self._pending.get(key)
+        if future is None:
+            future = self._pending[key] = loop.create_future()
+        if len(self._pending) >= self._max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self._window, self._flush)
+        return future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        pending, self._pending = self._pending, {}
+
+        by_tool: Dict[str, Dict[str, asyncio.Future]] = defaultdict(dict)
+        for (tool_id, version_id), future in pending.items():
+            by_tool[tool_id][version_id] = future
+        for tool_id, futures in by_tool.items():
+            task = asyncio.ensure_future(self._fetch_tool(tool_id, futures))
+            self._flushes.add(task)
+            task.add_done_callback(self._flushes.discard)
+
+    async def _fetch_tool(self, tool_id: str, futures: Dict[str, asyncio.Future]):
+        try:
+            r = await self._client.get(
+                f"/tools/{tool_id}/versions", params={"ids": list(futures)}
+            )
+            found = {v["id"]: v for v in r.json()} if r.status_code == 200 else {}
+        except Exception as e:
+            for future in futures.values():
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for version_id, future in futures.items():
+            if not future.done():
+                future.set_result(found.get(version_id))
+
+
+version_batcher: Optional[VersionBatcher] = None
+
+
+@app.on_event("startup")
+async def startup():
+    global http_client, version_batcher
+    http_client = httpx.AsyncClient(
+        base_url=REGISTRY_BASE_URL,
+        http2=REGISTRY_HTTP2,
+        timeout=5.0,
+        limits=httpx.Limits(
+            max_keepalive_connections=50, max_connections=100, keepalive_expiry=30
+        ),
+    )
+    version_batcher = VersionBatcher(http_client, VERSION_BATCH_WINDOW_MS, VERSION_BATCH_MAX)
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    if http_client is not None:
+        await http_client.aclose()
+
+
+# (tool_id, version_id) -> (expires_at, registry ToolVersion), least recently used first.
+# Only found versions are cached; the TTL bounds staleness after status changes.
+_version_cache: OrderedDict[Tuple[str, str], Tuple[float, Dict[str, Any]]] = OrderedDict()
+
+
+async def get_version(tool_id: str, version_id: str) -> Optional[Dict[str, Any]]:
+    # Registry ids are UUIDs; normalize so batched results match by id, and so
+    # one malformed id cannot fail the whole batch request.
+    try:
+        tool_id, version_id = str(uuid.UUID(tool_id)), str(uuid.UUID(version_id))
+    except ValueError:
+        return None
+    key = (tool_id, version_id)
+    cached = _version_cache.get(key)
+    if cached is not None and cached[0] > time.monotonic():
+        _version_cache.move_to_end(key)
+        return cached[1]
+
+    # Shielded: the future is shared with other callers waiting on the same batch
+    version = await asyncio.shield(version_batcher.fetch(tool_id, version_id))
+    if version is None:
+        return None
+
+    _version_cache[key] = (time.monotonic() + VERSION_CACHE_TTL_SECONDS, version)
+    _version_cache.move_to_end(key)
+    if len(_version_cache) > VERSION_CACHE_SIZE:
+        _version_cache.popitem(last=False)
+    return version
 
 
 class MutationType(str, Enum):
@@ -21,40 +148,83 @@ class MutationType(str, Enum):
     CREATE_NEW_VERSION = "CREATE_NEW_VERSION"
 
 
-class Mutation(BaseModel):
+class Mutation(msgspec.Struct):
     type: MutationType
     toolId: str
-    toolVersionId: Optional[str] = None
     payload: Dict[str, Any]
+    toolVersionId: Optional[str] = None
     mode: str = "dry-run"  # or "commit"
 
 
-class ApplyMutationResponse(BaseModel):
+class ApplyMutationResponse(msgspec.Struct):
     mutation: Mutation
     note: str
     currentVersion: Optional[Dict[str, Any]] = None
     newVersionPreview: Optional[Dict[str, Any]] = None
 
 
-@app.post("/mutations/apply", response_model=ApplyMutationResponse)
-async def apply_mutation(mutation: Mutation):
+# Built once; msgspec validates and decodes in a single pass.
+_mutation_decoder = msgspec.json.Decoder(Mutation)
+_response_encoder = msgspec.json.Encoder()
+
+# FastAPI can't derive schemas from msgspec Structs, so generate them with
+# msgspec and merge the components into /openapi.json (see openapi below).
+(_MUTATION_SCHEMA, _APPLY_MUTATION_RESPONSE_SCHEMA), _MSGSPEC_COMPONENTS = (
+    msgspec.json.schema_components(
+        [Mutation, ApplyMutationResponse], ref_template="#/components/schemas/{name}"
+    )
+)
+
+
+def openapi() -> Dict[str, Any]:
+    if app.openapi_schema is None:
+        schema = FastAPI.openapi(app)
+        schema.setdefault("components", {}).setdefault("schemas", {}).update(
+            _MSGSPEC_COMPONENTS
+        )
+    return app.openapi_schema
+
+
+app.openapi = openapi
+
+
+@app.post(
+    "/mutations/apply",
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {"application/json": {"schema": _MUTATION_SCHEMA}},
+        }
+    },
+    responses={
+        200: {
+            "description": "Successful Response",
+            "content": {"application/json": {"schema": _APPLY_MUTATION_RESPONSE_SCHEMA}},
+        }
+    },
+)
+async def apply_mutation(request: Request):
     """
     Very lightweight stub:
 
     - Fetches the current ToolVersion from the registry (if toolVersionId provided)
     - Does NOT actually persist any change yet; just echoes a preview.
     - You can extend this to modify schemas and POST/PATCH back to the registry.
+
+    The body is decoded straight into a msgspec Mutation rather than through
+    FastAPI's pydantic request parsing.
     """
+    try:
+        mutation = _mutation_decoder.decode(await request.body())
+    except msgspec.ValidationError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except msgspec.DecodeError as e:
+        raise HTTPException(status_code=422, detail=f"Invalid JSON body: {e}")
 
     current_version = None
 
     if mutation.toolVersionId:
-        async with httpx.AsyncClient() as client:
-            r = await client.get(
-                f"{REGISTRY_BASE_URL}/tools/{mutation.toolId}/versions/{mutation.toolVersionId}"
-            )
-            if r.status_code == 200:
-                current_version = r.json()
+        current_version = await get_version(mutation.toolId, mutation.toolVersionId)
 
     note = (
         "dry-run only; no change applied. Extend this service to write back to registry."
@@ -67,14 +237,21 @@ async def apply_mutation(mutation: Mutation):
     if current_version is not None:
         new_version_preview = {**current_version, "mutationPayload": mutation.payload}
 
-    return ApplyMutationResponse(
+    response = ApplyMutationResponse(
         mutation=mutation,
         note=note,
         currentVersion=current_version,
         newVersionPreview=new_version_preview,
     )
+    return Response(content=_response_encoder.encode(response), media_type="application/json")
+
+
+# Fixed for the life of the process, so encode it once for liveness probes.
+# A fresh Response per call: Starlette sends raw_headers by reference, and
+# middleware appending headers would otherwise accumulate on a shared instance.
+_HEALTH = orjson.dumps({"status": "ok", "registry_base_url": REGISTRY_BASE_URL})
 
 
 @app.get("/health")
 async def health():
-    return {"status": "ok", "registry_base_url": REGISTRY_BASE_URL}
+    return Response(content=_HEALTH, media_type="application/json")
@@ -1,8 +1,24 @@
+from functools import lru_cache
 from typing import Optional
 
-from fastapi import FastAPI, Query
+import orjson
+from fastapi import FastAPI, Query, Response
+from fastapi.responses import ORJSONResponse
 
-app = FastAPI(title="Weather Mock Service")
+app = FastAPI(title="Weather Mock Service", default_response_class=ORJSONResponse)
+
+
+@lru_cache(maxsize=10_000)
+def _weather_body(city: str, country: Optional[str]) -> bytes:
+    """
+    Serialized /weather payload. The mock is deterministic, so each
+    (city, country) is encoded once and served from the cache afterwards.
+    """
+    if country:
+        description = f"Fake sunny weather in {city} ({country})"
+    else:
+        description = f"Fake sunny weather in {city}"
+    return orjson.dumps({"temperatureC": 26.5, "description": description})
 
 
 @app.get("/weather")
@@ -13,17 +29,12 @@ async def get_weather(
     """
     Dummy weather endpoint for testing the Tool Gateway.
     """
-    desc_parts = [f"Fake sunny weather in {city}"]
-    if country:
-        desc_parts.append(f"({country})")
-    description = " ".join(desc_parts)
+    return Response(content=_weather_body(city, country), media_type="application/json")
+
 
-    return {
-        "temperatureC": 26.5,
-        "description": description,
-    }
+_HEALTH = orjson.dumps({"status": "ok"})
 
 
 @app.get("/health")
 async def health():
-    return {"status": "ok"}
+    return Response(content=_HEALTH, media_type="application/json")